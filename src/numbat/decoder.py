@@ -1,108 +1,374 @@
 """Provides Decoder, a utility class to decode video."""
+import sys
+from collections import deque
 from fractions import Fraction
+from typing import Tuple
 
 import av
 import numpy as np
+from av.codec.hwaccel import HWAccel, hwdevices_available
+from av.video.reformatter import ColorRange
 from PySide6 import QtCore as qtc
 
+# Hardware decoding device types to try for each platform, in order
+_HWACCEL_DEVICE_TYPES = {
+    "linux": ("vaapi", "cuda", "qsv"),
+    "win32": ("d3d11va", "cuda", "dxva2", "qsv"),
+    "darwin": ("videotoolbox",),
+}
+
+# Interleaved channels in each plane, for every supported pixel format
+_PLANE_CHANNELS = {
+    # yuvj420p is simply yuv420p but with full colors (0-255)
+    "yuv420p": (1, 1, 1),
+    "yuvj420p": (1, 1, 1),
+    # Hardware decoded frames are usually downloaded as NV12
+    # which has Cb and Cr interleaved in a single plane
+    "nv12": (1, 2),
+}
+
+# BT.709 YCbCr to RGB coefficients in 2.14 fixed point, same as the ones
+# used for display: Cr to R, Cb to G, Cr to G and Cb to B. Y's coefficient
+# is 1 for all of R, G and B in full range colors. Limited range colors
+# (16-235 for Y, 16-240 for Cb and Cr) are scaled to full range as well.
+_FIXED_POINT_BITS = 14
+_BT709_COEFFS = (1.5748, -0.18732, -0.46812, 1.8556)
+_CHROMA_COEFFS = {
+    True: tuple(round(c * (1 << _FIXED_POINT_BITS)) for c in _BT709_COEFFS),
+    False: tuple(
+        round(c * 255 / 224 * (1 << _FIXED_POINT_BITS)) for c in _BT709_COEFFS
+    ),
+}
+_LIMITED_Y_SCALE = round(255 / 219 * (1 << _FIXED_POINT_BITS))
+# Luma rows converted at a time by ycbcr_to_rgb, must be even
+_STRIP_ROWS = 64
+
+
+class DecodedFrame:
+    """A frame decoded by Decoder.
+
+    Attributes:
+        pts: Presentation timestamp in stream's time base units.
+        time_ns: Presentation timestamp in whole nanoseconds.
+        planes: A tuple of frame planes as arrays (whose rows may be
+            strided). Planes are Y, Cb and Cr as 2D arrays, except for NV12
+            frames (from hardware decoders) which have Y as a 2D array and
+            interleaved CbCr as a 3D array.
+        seeked: Whether the frame was decoded as result of a seek operation.
+    """
+
+    __slots__ = ("pts", "time_ns", "planes", "seeked")
+
+    def __init__(
+        self,
+        pts: int,
+        time_ns: int,
+        planes: Tuple[np.ndarray, ...],
+        seeked: bool = False,
+    ):
+        """Create a decoded frame.
+
+        Args:
+            pts: Presentation timestamp in stream's time base units.
+            time_ns: Presentation timestamp in whole nanoseconds.
+            planes: A tuple of frame planes.
+            seeked (optional): Whether the frame is result of a seek
+                operation. Defaults to False.
+        """
+        self.pts = pts
+        self.time_ns = time_ns
+        self.planes = planes
+        self.seeked = seeked
+
+
+def ycbcr_to_rgb(planes: Tuple[np.ndarray, ...], full_range: bool = True) -> np.ndarray:
+    """Convert planes of a decoded frame to an RGB image on CPU.
+
+    Meant for code that needs a frame's pixels in memory, e.g. to save it.
+    Display converts on GPU instead. Chroma is upsampled by pixel repetition.
+
+    Args:
+        planes: Planes of a frame decoded by Decoder.
+        full_range (optional): Whether colors span full range (0-255) rather
+            than limited range, as told by Decoder.full_range. Defaults to
+            True.
+
+    Returns:
+        A (height, width, 3) array of 8 bit RGB values.
+    """
+    y = planes[0]
+    if len(planes) == 2:
+        # NV12 with Cb and Cr interleaved
+        cb, cr = planes[1][..., 0], planes[1][..., 1]
+    else:
+        cb, cr = planes[1:]
+
+    h, w = y.shape
+    cw = cb.shape[1]
+    half = 1 << (_FIXED_POINT_BITS - 1)
+    cr_to_r, cb_to_g, cr_to_g, cb_to_b = _CHROMA_COEFFS[full_range]
+    rgb = np.empty((h, w, 3), np.uint8)
+    # Two rows of upsampled chroma per chroma row, reused for each strip and
+    # channel. The frame is converted in strips of _STRIP_ROWS luma rows so
+    # that the intermediates of a strip stay in cache between passes.
+    upsampled = np.empty((_STRIP_ROWS // 2, 2, 2 * cw), np.int16)
+    for top in range(0, h, _STRIP_ROWS):
+        rows = min(_STRIP_ROWS, h - top)
+        chroma_rows = (rows + 1) // 2
+        chroma = slice(top // 2, top // 2 + chroma_rows)
+        # Integer arithmetic in fixed point; products need 32 bits while the
+        # results (at most 9 bits plus sign) fit in 16 bits
+        cb_strip = cb[chroma].astype(np.int32) - 128
+        cr_strip = cr[chroma].astype(np.int32) - 128
+        # Chroma's contribution to R, G and B is computed once per chroma
+        # sample instead of upsampling chroma to full resolution first
+        chroma_rgb = (
+            (cr_to_r * cr_strip + half) >> _FIXED_POINT_BITS,
+            (cb_to_g * cb_strip + cr_to_g * cr_strip + half) >> _FIXED_POINT_BITS,
+            (cb_to_b * cb_strip + half) >> _FIXED_POINT_BITS,
+        )
+
+        strip = upsampled[:chroma_rows]
+        channel = strip.reshape(2 * chroma_rows, 2 * cw)[:rows, :w]
+        y_strip = y[top : top + rows]
+        if not full_range:
+            # Within -19 to 277, so fits in 16 bits like the channels
+            y_strip = (
+                (y_strip.astype(np.int32) - 16) * _LIMITED_Y_SCALE + half
+            ) >> _FIXED_POINT_BITS
+            y_strip = y_strip.astype(np.int16)
+        # Work on one channel at a time so that every pass is over contiguous
+        # 2D arrays; only the final store interleaves R, G and B
+        for i, term in enumerate(chroma_rgb):
+            strip[...] = term.astype(np.int16).repeat(2, axis=1)[:, np.newaxis]
+            # Luma contributes equally to R, G and B
+            channel += y_strip
+            np.clip(channel, 0, 255, out=channel)
+            rgb[top : top + rows, :, i] = channel
+    return rgb
+
 
 class Decoder(qtc.QObject):
     """Decoder to read a video and emit decoded frames via signals.
 
+    Decoder may be moved to a different thread than the one it was created
+    in. Seek requests can be made from any thread. After a frame is emitted,
+    a few frames are decoded ahead of time so that decoding overlaps with
+    rendering of the emitted frame whenever decoder has its own thread.
+
     Signals:
-        decoded: Finished decoding. Provides 3 values: a stream timestamp in
-            seconds, a tuple of video planes and a bool to indicate that the
-            decoded frame was result of a seek operation.
+        decoded: Finished decoding. Provides the DecodedFrame.
         finished: All frames have been decoded and resources deallocated.
             Any code referencing the decoded object should set it to None.
             Using decoder beyond this point has undefined behavior.
     """
 
-    decoded = qtc.Signal(float, tuple, bool)
+    decoded = qtc.Signal(object)
     finished = qtc.Signal()
 
-    def __init__(self, file_path: str):
+    # Maximum number of frames decoded ahead of time
+    _max_prefetched = 3
+
+    def __init__(self, file_path: str, hwaccel: bool = True):
         """Open the video at given path for decoding.
 
         Args:
             file_path: Path to video file.
+            hwaccel (optional): Whether to try decoding on hardware before
+                falling back to software decoding. Defaults to True.
+
+        Raises:
+            ValueError: If the file has no video stream or the video's pixel
+                format is not supported.
         """
         super().__init__()
         self._path = file_path
-        self._container = av.open(self._path, mode="r")
+        self._container = self._open(hwaccel)
+        if not self._container.streams.video:
+            self._container.close()
+            raise ValueError("no video stream")
+        self._stream = self._container.streams.video[0]
+        # Packets are demuxed and decoded separately, so that all frames that
+        # a packet decodes to are queued in a single call
+        self._codec = self._stream.codec_context
+        # Pixel format is fixed for a stream so it is validated only once
+        pix_fmt = self._codec.pix_fmt
+        if pix_fmt not in _PLANE_CHANNELS:
+            self._container.close()
+            raise ValueError(
+                f"Unsupported pixel format '{pix_fmt}' in video. "
+                "Only yuv420p/yuvj420p/nv12 videos are supported."
+            )
         # Default is SLICE: allows multiple threads to decode a single frame
         # FRAME: Enable multiple threads to decode independent frames
-        self._container.streams.video[0].thread_type = "FRAME"
-        self._decoder = self._container.decode(video=0)
+        self._stream.thread_type = "FRAME"
+        self._time_base = self._stream.time_base
+        # Time base as integers to convert pts to ns without floating point
+        self._tb_num = self._time_base.numerator * 1_000_000_000
+        self._tb_den = self._time_base.denominator
+        self._packets = self._container.demux(self._stream)
+        # Frames decoded ahead of time
+        self._prefetched = deque()
+        # Format and dimensions of last decoded frame and its plane layouts
+        self._geometry = None
+        self._layouts = None
         # Most up to date position to seek to
         self._seek = None
+        # Guards '_seek' which may be set from a thread other than decoder's
+        self._seek_mutex = qtc.QMutex()
 
+    @qtc.Slot()
     def on_decode(self):
         """Handle decode signal.
 
         If decoding results in a new frame, 'decoded' signal is emitted.
-
-        Raises:
-            ValueError: If the opened video file format is not supported.
         """
         if self.is_closed():
             return
 
-        seeked = self._seek is not None
+        with qtc.QMutexLocker(self._seek_mutex):
+            seek_to, self._seek = self._seek, None
+        seeked = seek_to is not None
         if seeked:
             # Seek to a keyframe near offset specified in stream.time_base
             # since we specified stream explicitly
-            self._container.seek(self._seek, stream=self._container.streams.video[0])
-            self._seek = None
+            self._container.seek(seek_to, stream=self._stream)
+            # Demux afresh; frames decoded ahead are from before the seek
+            self._packets = self._container.demux(self._stream)
+            self._prefetched.clear()
 
-        frame = next(self._decoder, None)
-        if frame is None:
+        if not self._prefetched and not self._decode_next():
             self.close()
             self.finished.emit()
             return
 
-        if frame.format.name not in ["yuv420p", "yuvj420p"]:
-            # Only supported pixel format are yuv420p and yuvj420p
-            # yuvj420p is simply yuv420p but with full colors (0-255)
-            raise ValueError(
-                f"Unsupported pixel format '{frame.format.name} 'in video. "
-                "Only yuv420p/yuvj420p videos are supported."
-            )
+        frame = self._prefetched.popleft()
+        frame.seeked = seeked
+        self.decoded.emit(frame)
+
+        # Decode ahead while the emitted frame is being rendered
+        while len(self._prefetched) < self._max_prefetched and self._decode_next():
+            pass
+
+    def _decode_next(self) -> bool:
+        """Decode the next packet(s) and queue frames to be emitted later.
+
+        Packets are decoded until at least one frame comes out. All frames
+        decoded from a packet are queued at once.
+
+        Returns:
+            True if any frame was decoded, False if there are no more frames.
+        """
+        frames = None
+        while not frames:
+            packet = next(self._packets, None)
+            if packet is None:
+                return False
+            # Decoder may buffer a packet without output, e.g. with frame
+            # threading, or output several frames for one packet. Last
+            # packets demuxed are empty and flush the buffered frames.
+            frames = self._codec.decode(packet)
+
+        for frame in frames:
+            # Plane geometry only changes if stream's resolution or format does
+            geometry = (frame.format.name, frame.width, frame.height)
+            if geometry != self._geometry:
+                self._layouts = self._plane_layouts(frame)
+                self._geometry = geometry
+
+            planes = tuple(map(self._remove_padding, frame.planes, self._layouts))
+            time_ns = frame.pts * self._tb_num // self._tb_den
+            self._prefetched.append(DecodedFrame(frame.pts, time_ns, planes))
+        return True
+
+    def _open(self, hwaccel: bool) -> av.container.InputContainer:
+        """Open the video file, preferably for decoding on hardware.
+
+        Args:
+            hwaccel: Whether to try hardware decoding devices first.
 
-        y, cb, cr = map(self._remove_padding, frame.planes)
-        self.decoded.emit(frame.time, (y, cb, cr), seeked)
+        Returns:
+            The opened container.
+        """
+        if hwaccel:
+            available = hwdevices_available()
+            for device_type in _HWACCEL_DEVICE_TYPES.get(sys.platform, ()):
+                if device_type not in available:
+                    continue
+                try:
+                    # Falls back to software decoding if device can't decode
+                    # the stream; frames are downloaded to system memory
+                    return av.open(self._path, mode="r", hwaccel=HWAccel(device_type))
+                except av.FFmpegError:
+                    # Device missing or failed to initialize, try next one
+                    continue
+        return av.open(self._path, mode="r")
 
-    def _remove_padding(self, plane: av.video.plane.VideoPlane) -> np.ndarray:
-        """Remove padding from a video frame's plane.
+    @staticmethod
+    def _plane_layouts(frame: av.VideoFrame) -> Tuple[Tuple[tuple, tuple], ...]:
+        """Compute layouts of views of a frame's planes that exclude padding.
+
+        Args:
+            frame: A decoded frame.
+
+        Returns:
+            A tuple of (shape, strides) for each plane of frame.
+
+        """
+        channels = _PLANE_CHANNELS[frame.format.name]
+        layouts = []
+        for plane, n in zip(frame.planes, channels):
+            shape = (plane.height, plane.width)
+            strides = (plane.line_size, n)
+            if n > 1:
+                shape += (n,)
+                strides += (1,)
+            layouts.append((shape, strides))
+        return tuple(layouts)
+
+    @staticmethod
+    def _remove_padding(
+        plane: av.video.plane.VideoPlane, layout: Tuple[tuple, tuple]
+    ) -> np.ndarray:
+        """Create a view of a video frame's plane that excludes padding.
+
+        No data is copied: rows of the returned array keep the plane's line
+        size as their stride, which the renderer must account for. This is
+        preferred over VideoFrame.to_ndarray() which packs all planes of a
+        4:2:0 frame into a single contiguous array, i.e. copies them.
 
         Args:
             plane: The plane to remove padding from.
+            layout: Shape and strides of the view as computed by
+                _plane_layouts().
 
         Returns:
-            A 2D array representing the plane data with padding removed.
+            A 2D array view of the plane data with padding removed, or a 3D
+            array view if the plane has interleaved channels.
         """
-        buf_width = plane.line_size
-        bytes_per_pixel = 1
-        frame_width = plane.width * bytes_per_pixel
-        arr = np.frombuffer(plane, np.uint8)
-        if buf_width != frame_width:
-            # Slice (create a view) at the frame width
-            arr = arr.reshape(-1, buf_width)[:, :frame_width]
-        return arr.reshape(-1, frame_width)
+        shape, strides = layout
+        return np.ndarray(shape, np.uint8, buffer=plane, strides=strides)
 
     @property
     def duration(self) -> int:
         """Duration in stream.time_base units."""
-        stream = self._container.streams.video[0]
-        duration = stream.duration
+        duration = self._stream.duration
         if duration is None:
-            duration = self._container.duration / av.time_base / stream.time_base
+            duration = self._container.duration / av.time_base / self._time_base
         return int(duration + 0.5)
 
+    @property
+    def full_range(self) -> bool:
+        """Whether colors span full range (0-255) rather than limited range."""
+        return (
+            self._codec.pix_fmt == "yuvj420p"
+            or self._codec.color_range == ColorRange.JPEG
+        )
+
     @property
     def time_base(self) -> Fraction:
         """Time base of stream."""
-        return self._container.streams.video[0].time_base
+        return self._time_base
 
     def seek(self, to: int):
         """Seek to the specified timestamp in stream.
@@ -110,13 +376,15 @@ class Decoder(qtc.QObject):
         Args:
             to (int): timestamp in stream's time base units.
         """
-        self._seek = to
+        with qtc.QMutexLocker(self._seek_mutex):
+            self._seek = to
 
     def close(self):
         """Deallocate all decoding resources."""
         self._container.close()
-        self._decoder = None
+        self._packets = None
         self._container = None
+        self._prefetched.clear()
         self._seek = None
 
     def is_closed(self):
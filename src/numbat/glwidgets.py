@@ -1,20 +1,248 @@
 """OpenGL based custom Qt widgets."""
+import ctypes
 from textwrap import dedent
 from typing import Tuple
 
-from OpenGL import GL
+import numpy as np
+import OpenGL
 from PySide6 import QtCore as qtc
 from PySide6 import QtGui as qtg
-from PySide6 import QtOpenGL as qgl
 from PySide6 import QtOpenGLWidgets as qglw
 from PySide6 import QtWidgets as qtw
 
+# By default PyOpenGL calls glGetError() after every GL call and checks sizes
+# of arrays passed, which adds up for calls made every frame. Must be set
+# before OpenGL.GL is imported. Set PYOPENGL_ERROR_CHECKING=1 to debug.
+OpenGL.ERROR_CHECKING = OpenGL.environ_key("ERROR_CHECKING", False)
+OpenGL.ARRAY_SIZE_CHECKING = OpenGL.environ_key("ARRAY_SIZE_CHECKING", False)
+
+from OpenGL import GL  # noqa: E402
+from OpenGL.GL.KHR import parallel_shader_compile  # noqa: E402
+
+
+class _TextureUploader(qtc.QObject):
+    """Uploads frames to textures from a thread other than GUI's.
+
+    The uploader has its own OpenGL context sharing objects with the context
+    of the widget that draws the textures. Frames are staged in a ring of
+    pixel buffer objects, and textures are updated from them.
+
+    Signals:
+        uploaded: Finished uploading a frame, textures are ready to draw.
+    """
+
+    uploaded = qtc.Signal()
+
+    # Number of pixel buffer objects that frames are staged in, in turn
+    _num_pbos = 2
+    # Alignment in bytes of each plane's offset within a pixel buffer object
+    _pbo_alignment = 64
+
+    def __init__(self, share_context: qtg.QOpenGLContext):
+        """Create an uploader, must be called from the GUI thread.
+
+        Args:
+            share_context: Context of widget drawing the textures.
+        """
+        super().__init__()
+        self._gui_thread = qtc.QThread.currentThread()
+        # Offscreen surfaces can only be created in the GUI thread
+        self._surface = qtg.QOffscreenSurface()
+        self._surface.setFormat(share_context.format())
+        self._surface.create()
+        self._context = qtg.QOpenGLContext()
+        self._context.setFormat(share_context.format())
+        self._context.setShareContext(share_context)
+        self._context.create()
+
+        # Pixel buffer objects, index of the one to stage next frame in and
+        # sizes of their allocated storage in bytes
+        self._pbos = None
+        self._pbo_index = 0
+        self._pbo_sizes = [0] * self._num_pbos
+
+        # Height, Width, Format of each texture's allocated storage
+        # Used to determine if texture needs reallocating or not
+        self._shapes = {}
+
+    def moveToThread(self, thread: qtc.QThread):
+        """Change thread affinity of the uploader and its context.
+
+        Args:
+            thread: Thread to upload frames from.
+        """
+        super().moveToThread(thread)
+        self._context.moveToThread(thread)
+
+    @qtc.Slot(object, object)
+    def on_upload(self, ycbcr: Tuple, textures: Tuple):
+        """Upload frame data to textures, allocating storage if needed.
+
+        This method will emit 'uploaded' signal when done.
+
+        Args:
+            ycbcr (Tuple): A tuple of frame planes, either Y, Cb and Cr as 2D
+                arrays or Y as a 2D array and interleaved CbCr as a 3D array.
+                Rows of each plane must be contiguous but may be strided.
+            textures (Tuple): Y and CbCr textures to upload planes to.
+        """
+        if self._pbos is None:
+            # Context is used by this thread only, so it is left current
+            # until released rather than made current for every frame
+            self._context.makeCurrent(self._surface)
+            # Storage is allocated by the first frame staged in each buffer
+            self._pbos = list(GL.glGenBuffers(self._num_pbos))
+            # Rows of staged planes are not padded to a multiple of 4 bytes.
+            # Pixel storage state is per context, so set it only once.
+            GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        self._upload(ycbcr, textures)
+        # Textures are drawn from widget's context, so uploads must be
+        # complete rather than just issued before they are announced
+        GL.glFinish()
+        self.uploaded.emit()
+
+    @qtc.Slot()
+    def release(self):
+        """Release acquired resources and hand context back to GUI thread.
+
+        Must be called from the uploader's thread before it quits.
+        """
+        if self._pbos is not None:
+            # Context is still current since first upload
+            GL.glDeleteBuffers(self._pbos)
+            self._pbos = None
+            self._context.doneCurrent()
+        self._shapes.clear()
+        self._context.moveToThread(self._gui_thread)
+
+    def _upload(self, ycbcr: Tuple, textures: Tuple):
+        """Stage frame in next pixel buffer object and update textures.
+
+        Args:
+            ycbcr (Tuple): A tuple of frame planes.
+            textures (Tuple): Y and CbCr textures to upload planes to.
+        """
+        y = ycbcr[0]
+        h, w = y.shape
+        ch, cw = ycbcr[1].shape[:2]
+        # NV12 chroma can be staged as is, with its padding, unless padding
+        # is not a whole number of CbCr pairs which GL could skip
+        as_is = len(ycbcr) == 2 and ycbcr[1].strides[0] % 2 == 0
+        # Bytes spanned by luma rows, including padding in between
+        y_span = (h - 1) * y.strides[0] + w
+        if as_is:
+            cbcr_pitch = ycbcr[1].strides[0]
+            cbcr_span = (ch - 1) * cbcr_pitch + 2 * cw
+        else:
+            # Chroma is interleaved, or copied, while staging in packed rows
+            cbcr_pitch = 2 * cw
+            cbcr_span = ch * cbcr_pitch
+        cbcr_offset = -(-y_span // self._pbo_alignment) * self._pbo_alignment
+        size = cbcr_offset + cbcr_span
+
+        # Stage the frame in the next pixel buffer object in turn. Textures
+        # are then updated from it by GL asynchronously, instead of being
+        # copied from planes' memory before glTexSubImage2D returns.
+        idx = self._pbo_index
+        self._pbo_index = (idx + 1) % self._num_pbos
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, self._pbos[idx])
+        if self._pbo_sizes[idx] < size:
+            GL.glBufferData(GL.GL_PIXEL_UNPACK_BUFFER, size, None, GL.GL_STREAM_DRAW)
+            self._pbo_sizes[idx] = size
+        # Every upload is finished before the next one starts, so GL need
+        # not check whether the buffer is still in use before mapping it
+        dst = GL.glMapBufferRange(
+            GL.GL_PIXEL_UNPACK_BUFFER,
+            0,
+            size,
+            GL.GL_MAP_WRITE_BIT
+            | GL.GL_MAP_INVALIDATE_BUFFER_BIT
+            | GL.GL_MAP_UNSYNCHRONIZED_BIT,
+        )
+        ctypes.memmove(dst, y.ctypes.data, y_span)
+        if as_is:
+            ctypes.memmove(dst + cbcr_offset, ycbcr[1].ctypes.data, cbcr_span)
+        else:
+            staged = np.ndarray(
+                (ch, cw, 2),
+                np.uint8,
+                buffer=(ctypes.c_ubyte * cbcr_span).from_address(dst + cbcr_offset),
+                strides=(cbcr_pitch, 2, 1),
+            )
+            if len(ycbcr) == 2:
+                staged[...] = ycbcr[1]
+            else:
+                staged[..., 0] = ycbcr[1]
+                staged[..., 1] = ycbcr[2]
+        GL.glUnmapBuffer(GL.GL_PIXEL_UNPACK_BUFFER)
+
+        # Rows may be padded, and are staged with their padding; let GL skip
+        # it while unpacking. Row length is in pixels, not bytes.
+        self._update_texture(textures[0], GL.GL_RED, w, h, y.strides[0], 0)
+        self._update_texture(
+            textures[1], GL.GL_RG, cw, ch, cbcr_pitch // 2, cbcr_offset
+        )
+
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, 0)
+        GL.glPixelStorei(GL.GL_UNPACK_ROW_LENGTH, 0)
+
+    def _update_texture(
+        self,
+        tex: GL.GLuint,
+        fmt: GL.GLenum,
+        w: int,
+        h: int,
+        row_length: int,
+        offset: int,
+    ):
+        """Update a texture from the bound pixel buffer object.
+
+        Args:
+            tex: Texture to update.
+            fmt: Format of texture (and of staged pixels).
+            w: Width of staged pixels.
+            h: Height of staged pixels.
+            row_length: Distance between staged rows in pixels.
+            offset: Offset of staged pixels in bytes.
+        """
+        GL.glBindTexture(GL.GL_TEXTURE_2D, tex)
+        if self._shapes.get(tex) != (h, w, fmt):
+            # Allocate storage only when resolution changes; every frame
+            # (including this one) is then uploaded into it below
+            GL.glTexImage2D(
+                GL.GL_TEXTURE_2D,
+                0,
+                fmt,
+                w,
+                h,
+                0,
+                fmt,
+                GL.GL_UNSIGNED_BYTE,
+                None,
+            )
+            self._shapes[tex] = (h, w, fmt)
+
+        GL.glPixelStorei(GL.GL_UNPACK_ROW_LENGTH, row_length)
+        GL.glTexSubImage2D(
+            GL.GL_TEXTURE_2D,
+            0,
+            0,
+            0,
+            w,
+            h,
+            fmt,
+            GL.GL_UNSIGNED_BYTE,
+            GL.GLvoidp(offset),
+        )
+
 
 class YCbCrDisplayWidget(qglw.QOpenGLWidget):
-    """OpenGL widget to display YCbCr 4:2:0 planar frames.
+    """OpenGL widget to display YCbCr 4:2:0 planar or NV12 frames.
 
     The widget uses OpenGL shaders to convert YCbCr to RGB space. Performance
-    should be better than doing the conversion in software.
+    should be better than doing the conversion in software. Frames are
+    uploaded from a separate thread, to a second set of textures so that
+    the frame being drawn is not overwritten.
 
     Signals:
         prepared: Finished preparations for rendering.
@@ -23,28 +251,28 @@ class YCbCrDisplayWidget(qglw.QOpenGLWidget):
 
     prepared = qtc.Signal()
     rendered = qtc.Signal()
+    # Sends a frame and textures to upload it to, to the uploader's thread
+    _upload = qtc.Signal(object, object)
 
-    # Vertex shader source
+    # Vertex shader source, encoded once as GL takes bytes
     _vtx_shader_src = dedent(
         """
     #version 130
 
-    // Position of vertex
-    in vec2 posIn;
-    // Texture coordinates for the vertex
-    in vec2 texPosIn;
-
     // To forward texture coordinates to fragment shader
     out vec2 texPos;
 
     void main() {
-        texPos = texPosIn;
-        gl_Position = vec4(posIn, 0.0, 1.0);
+        // Vertices 0 to 3 are top left, top right, bottom left and bottom
+        // right corners of a rectangle covering the viewport, drawn as a
+        // triangle strip. Texture's first row is at the top.
+        texPos = vec2(gl_VertexID & 1, gl_VertexID >> 1);
+        gl_Position = vec4(texPos.x * 2.0 - 1.0, 1.0 - texPos.y * 2.0, 0.0, 1.0);
     }
     """
-    )
+    ).encode("utf-8")
 
-    # Fragment shader source
+    # Fragment shader source, encoded once as well
     _frag_shader_src = dedent(
         """
     #version 130
@@ -55,62 +283,53 @@ class YCbCrDisplayWidget(qglw.QOpenGLWidget):
     out vec4 fragColor;
 
     // 3x3 colorspace conversion matrix to transform YUV color to RGB space
-    // Different standards suggest different matrices
-    // uniform mat3 cs_matrix;
-    const mat3 cs_matrix = mat3(
-        1       ,  1       ,  1       ,
-        0       , -0.18732 ,  1.8556 ,
-        1.5748 , -0.46812 ,  0
-    );
+    // Different standards suggest different matrices; scaling of limited
+    // range colors is folded into it
+    uniform mat3 cs_matrix;
+    // Added after conversion, folds in offsets of YUV color channels
+    uniform vec3 cs_bias;
 
     // Y plane of frame (full resolution, 8 bits)
     uniform sampler2D tex_y;
-    // Cb plane of frame (quarter resolution, 8 bits)
-    uniform sampler2D tex_cb;
-    // Cr plane of frame (quarter resolution, 8 bits)
-    uniform sampler2D tex_cr;
+    // Cb and Cr planes of frame interleaved (quarter resolution, 8 bits each)
+    uniform sampler2D tex_cbcr;
 
     void main() {
         vec3 yuv;
         vec3 rgb;
 
         yuv.x = texture(tex_y, texPos).r;
-        // Clamp chroma channels between -0.5 to 0.5 for colorspace conversion
-        yuv.y = texture(tex_cb, texPos).r - 0.5;
-        yuv.z = texture(tex_cr, texPos).r - 0.5;
+        // Chroma samples are sited with left luma sample of each pair, as in
+        // MPEG-2, H.264 and HEVC, not in the middle like texels; sampling
+        // quarter of a texel to the right puts them where they belong
+        float cbcrOffset = 0.25 / float(textureSize(tex_cbcr, 0).x);
+        yuv.yz = texture(tex_cbcr, vec2(texPos.x + cbcrOffset, texPos.y)).rg;
 
-        rgb = cs_matrix * yuv;
+        rgb = cs_matrix * yuv + cs_bias;
         fragColor = vec4(rgb, 1.0);
     }
     """
+    ).encode("utf-8")
+
+    # BT.709 YCbCr to RGB matrix, each row gives R, G or B from Y, Cb and Cr
+    _bt709_matrix = np.array(
+        [[1.0, 0.0, 1.5748], [1.0, -0.18732, -0.46812], [1.0, 1.8556, 0.0]]
     )
+    # Offsets and scales of Y, Cb and Cr that map luma to 0 to 1 and chroma
+    # to about -0.5 to 0.5, centered at 0 for neutral chroma of 128, for full
+    # (0-255) and limited (16-235/240) range colors
+    _range_offset = {
+        True: (0.0, 128 / 255, 128 / 255),
+        False: (16 / 255, 128 / 255, 128 / 255),
+    }
+    _range_scale = {True: (1.0, 1.0, 1.0), False: (255 / 219, 255 / 224, 255 / 224)}
 
-    # Vertex data contains positions of our rectangle and corresponding
-    # texture coordinates
-    _vertices = [
-        # position_x, position_y, texture_s, texture_t
-        -1.0,
-        1.0,
-        0.0,
-        0.0,  # 0
-        1.0,
-        1.0,
-        1.0,
-        0.0,  # 1
-        -1.0,
-        -1.0,
-        0.0,
-        1.0,  # 2
-        1.0,
-        -1.0,
-        1.0,
-        1.0,  # 3
-    ]
-
-    # Indices to draw a rectangle with TRIANGLES_STRIP
-    _indices = [0, 1, 2, 3]
-
-    _bt709_transform_rgb = []
+    # Texture units that Y and CbCr textures are bound to
+    _tex_units = (GL.GL_TEXTURE0, GL.GL_TEXTURE1)
+    # Uniforms of program, looked up once it is linked
+    _uniform_names = ("cs_matrix", "cs_bias", "tex_y", "tex_cbcr")
+    # Surface format of all widgets, see _default_format()
+    _format = None
 
     def __init__(self, parent: qtw.QWidget = None):
         """Create a YCbCr display widget.
@@ -119,59 +338,92 @@ class YCbCrDisplayWidget(qglw.QOpenGLWidget):
             parent (optional): Parent widget. Defaults to None.
         """
         super().__init__(parent=parent)
-
-        # Request OpenGL 3.0 Core Profile context
-        fmt = qtg.QSurfaceFormat()
-        fmt.setRenderableType(qtg.QSurfaceFormat.RenderableType.OpenGL)
-
-        self._profile = qgl.QOpenGLVersionProfile()
-        self._profile.setVersion(3, 0)
-        self._profile.setProfile(qtg.QSurfaceFormat.OpenGLContextProfile.CoreProfile)
-
-        # Make it explicit that we need OpenGL 3.0 Core context
-        fmt.setVersion(*self._profile.version())
-        fmt.setProfile(self._profile.profile())
-        self.setFormat(fmt)
+        self.setFormat(self._default_format())
 
         self._program = None
         self._vao = None
-        self._buff_vertices = None
-        self._buff_indices = None
-
-        self._tex_y = None
-        self._tex_cb = None
-        self._tex_cr = None
-
-        # Height, Width of Y, Cb, Cr planes rendered previously
-        # Used to determine if texture needs reallocating or not
-        self._shapes = ([-1, -1], [-1, -1], [-1, -1])
+        # Shaders of program, until it is linked
+        self._shaders = None
+        # Locations of uniforms in program, by name
+        self._uniforms = None
+
+        # Y and CbCr textures being drawn and ones next frame is uploaded to;
+        # swapped when a frame is rendered
+        self._textures = None
+        self._back_textures = None
+        # Uploads frames from its own thread
+        self._uploader = None
+        self._upload_thread = None
+        # Whether frames have full range colors rather than limited range
+        self._full_range = True
+        # Whether a rendered frame is yet to be swapped to screen
+        self._swap_pending = False
+        self.frameSwapped.connect(self._on_frame_swapped)
+        # Window watched for no longer being exposed, e.g. when covered
+        self._exposed_window = None
+
+    @classmethod
+    def _default_format(cls) -> qtg.QSurfaceFormat:
+        """Surface format requesting an OpenGL 3.0 Core Profile context.
+
+        Returns:
+            The format, which is created on first call and reused after.
+        """
+        if cls._format is None:
+            fmt = qtg.QSurfaceFormat()
+            fmt.setRenderableType(qtg.QSurfaceFormat.RenderableType.OpenGL)
+            # Make it explicit that we need OpenGL 3.0 Core context
+            fmt.setVersion(3, 0)
+            fmt.setProfile(qtg.QSurfaceFormat.OpenGLContextProfile.CoreProfile)
+            cls._format = fmt
+        return cls._format
 
     def _compile_gl(self):
-        """Compile shaders and link OpenGL program."""
+        """Compile shaders and link OpenGL program.
+
+        Drivers may compile and link in the background, so results are not
+        checked here but by _check_gl(), leaving time for other work.
+        """
         self._program = GL.glCreateProgram()
 
         vtx_shader = GL.glCreateShader(GL.GL_VERTEX_SHADER)
         self._compile_shader(vtx_shader, self._vtx_shader_src)
         frag_shader = GL.glCreateShader(GL.GL_FRAGMENT_SHADER)
         self._compile_shader(frag_shader, self._frag_shader_src)
+        self._shaders = (vtx_shader, frag_shader)
 
         GL.glAttachShader(self._program, vtx_shader)
         GL.glAttachShader(self._program, frag_shader)
 
-        GL.glBindAttribLocation(self._program, 0, "posIn")
-        GL.glBindAttribLocation(self._program, 1, "texPosIn")
+        GL.glLinkProgram(self._program)
 
-        self._link_program(self._program)
+    def _check_gl(self):
+        """Check that OpenGL program is linked and delete its shaders.
 
-        GL.glDeleteShader(vtx_shader)
-        GL.glDeleteShader(frag_shader)
+        Raises:
+            ValueError: If shader compilation or program linking fails
+        """
+        try:
+            # Waits for linking to finish if it is still going on
+            link_status = GL.glGetProgramiv(self._program, GL.GL_LINK_STATUS)
+            if link_status != GL.GL_TRUE:
+                # Tell if it is because a shader failed to compile
+                for shader in self._shaders:
+                    self._check_shader(shader)
+                log = GL.glGetProgramInfoLog(self._program)
+                raise ValueError(f"ERROR: Program linking failed\n\n{log}")
+        finally:
+            for shader in self._shaders:
+                GL.glDeleteShader(shader)
+            self._shaders = None
 
     def _init_gl_buffers(self):
         """Create and initialize OpenGL buffers."""
-        # Luma, Cb and Cr textures
-        self._tex_y, self._tex_cb, self._tex_cr = GL.glGenTextures(3)
+        # Two sets of Luma and interleaved Cb and Cr textures
+        textures = tuple(GL.glGenTextures(4))
+        self._textures, self._back_textures = textures[:2], textures[2:]
 
-        for tex in [self._tex_y, self._tex_cb, self._tex_cr]:
+        for tex in textures:
             GL.glBindTexture(GL.GL_TEXTURE_2D, tex)
             # Wrapping behavior
             GL.glTexParameteri(
@@ -184,68 +436,37 @@ class YCbCrDisplayWidget(qglw.QOpenGLWidget):
             GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
             GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
 
+        # Vertices are generated by vertex shader and need no buffers, but
+        # core profile still needs a vertex array object bound to draw
         self._vao = GL.glGenVertexArrays(1)
-        GL.glBindVertexArray(self._vao)
-
-        self._buff_vertices, self._buff_indices = GL.glGenBuffers(2)
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._buff_vertices)
-        data = (GL.GLfloat * len(self._vertices))(*self._vertices)
-        GL.glBufferData(GL.GL_ARRAY_BUFFER, GL.sizeof(data), data, GL.GL_STATIC_DRAW)
-
-        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self._buff_indices)
-        indices = (GL.GLubyte * len(self._indices))(*self._indices)
-        GL.glBufferData(
-            GL.GL_ELEMENT_ARRAY_BUFFER, GL.sizeof(indices), indices, GL.GL_STATIC_DRAW
-        )
 
-        float_size = GL.sizeof(GL.GLfloat)
+    @staticmethod
+    def _compile_shader(shader: GL.GLuint, shader_source: bytes):
+        """Start compiling the shader against the given source.
 
-        GL.glVertexAttribPointer(
-            0, 2, GL.GL_FLOAT, GL.GL_FALSE, 4 * float_size, GL.GLvoidp(0)
-        )
-        GL.glVertexAttribPointer(
-            1, 2, GL.GL_FLOAT, GL.GL_FALSE, 4 * float_size, GL.GLvoidp(2 * float_size)
-        )
-        GL.glEnableVertexAttribArray(0)
-        GL.glEnableVertexAttribArray(1)
+        Args:
+            shader: Handle to the shader
+            shader_source: Shader source code, encoded
+        """
+        GL.glShaderSource(shader, [shader_source])
+        GL.glCompileShader(shader)
 
     @staticmethod
-    def _compile_shader(shader: GL.GLuint, shader_source: str, encoding: str = "utf-8"):
-        """Compile the shader against the given source.
+    def _check_shader(shader: GL.GLuint):
+        """Check that the shader is compiled.
 
         Args:
             shader: Handle to the shader
-            shader_source: Shader source code
-            encoding (optional): Source code encoding. Defaults to "utf-8"
 
         Raises:
-            ValueError: If shader compilation fails
+            ValueError: If shader compilation failed
         """
-        GL.glShaderSource(shader, [shader_source.encode(encoding)])
-        GL.glCompileShader(shader)
         compile_status = GL.glGetShaderiv(shader, GL.GL_COMPILE_STATUS)
         if compile_status != GL.GL_TRUE:
             # Compilation failed
             log = GL.glGetShaderInfoLog(shader)
             raise ValueError(f"ERROR: Shader compilation failed\n\n{log}")
 
-    @staticmethod
-    def _link_program(program: GL.GLuint):
-        """Link the OpenGL program.
-
-        Args:
-            program: Handle to OpenGL program
-
-        Raises:
-            ValueError: If program linking fails
-        """
-        GL.glLinkProgram(program)
-        link_status = GL.glGetProgramiv(program, GL.GL_LINK_STATUS)
-        if link_status != GL.GL_TRUE:
-            # Linking failed
-            log = GL.glGetProgramInfoLog(program)
-            raise ValueError(f"ERROR: Program linking failed\n\n{log}")
-
     def initializeGL(self):
         """Set up any required OpenGL resources and state.
 
@@ -257,20 +478,69 @@ class YCbCrDisplayWidget(qglw.QOpenGLWidget):
         """
         # Get the OpenGL functions appropriate to our current context
         self.context().aboutToBeDestroyed.connect(self.cleanup)
+        if self.context().hasExtension(b"GL_KHR_parallel_shader_compile"):
+            # Let driver use as many threads as it likes to compile shaders
+            parallel_shader_compile.glMaxShaderCompilerThreadsKHR(0xFFFFFFFF)
         self._compile_gl()
+        # Buffers are set up while shaders may still be compiling
         self._init_gl_buffers()
+        self._check_gl()
+        self._uniforms = {
+            name: GL.glGetUniformLocation(self._program, name)
+            for name in self._uniform_names
+        }
 
         GL.glClearColor(0.0, 0.0, 0.0, 1.0)
         # Set uniforms (must 'use' program before setting)
         GL.glUseProgram(self._program)
 
-        # uni_loc = GL.glGetUniformLocation(self._program, 'cs_matrix')
-        # GL.glUniformMatrix3fv()
+        self._set_colorspace()
+
+        # Assign texture units 0 and 1 to Y and CbCr textures
+        GL.glUniform1i(self._uniforms["tex_y"], 0)
+        GL.glUniform1i(self._uniforms["tex_cbcr"], 1)
+
+        self._uploader = _TextureUploader(self.context())
+        self._upload_thread = qtc.QThread()
+        self._uploader.moveToThread(self._upload_thread)
+        self._upload.connect(self._uploader.on_upload)
+        self._uploader.uploaded.connect(self.prepared)
+        self._upload_thread.start()
 
-        # Assign texture units 0, 1 and 2 to Y, Cb and Cr textures
-        for i, tex_name in enumerate(["tex_y", "tex_cb", "tex_cr"]):
-            tex_loc = GL.glGetUniformLocation(self._program, tex_name)
-            GL.glUniform1i(tex_loc, i)
+    def _set_colorspace(self):
+        """Set colorspace conversion uniforms for current color range.
+
+        Program must be in use.
+        """
+        # Scaling Y, Cb and Cr after subtracting their offsets is the same as
+        # multiplying by scaled matrix, then adding the bias below
+        matrix = self._bt709_matrix * self._range_scale[self._full_range]
+        bias = -matrix @ self._range_offset[self._full_range]
+        GL.glUniformMatrix3fv(
+            self._uniforms["cs_matrix"],
+            1,
+            GL.GL_TRUE,
+            matrix.astype(np.float32),
+        )
+        GL.glUniform3f(self._uniforms["cs_bias"], *bias)
+
+    def set_full_range(self, full_range: bool):
+        """Set the color range of frames to display.
+
+        Args:
+            full_range: True if colors span full range (0-255), False if they
+                are limited range (16-235 for Y, 16-240 for Cb and Cr).
+        """
+        if full_range == self._full_range:
+            return
+        self._full_range = full_range
+        # Otherwise set when program is created
+        if self._program is not None:
+            self.makeCurrent()
+            GL.glUseProgram(self._program)
+            self._set_colorspace()
+            self.doneCurrent()
+            self.update()
 
     def paintGL(self):
         """Paint the scene using OpenGL functions.
@@ -283,8 +553,12 @@ class YCbCrDisplayWidget(qglw.QOpenGLWidget):
 
         GL.glUseProgram(self._program)
         GL.glBindVertexArray(self._vao)
+        # Draw the textures of last rendered frame
+        for unit, tex in zip(self._tex_units, self._textures):
+            GL.glActiveTexture(unit)
+            GL.glBindTexture(GL.GL_TEXTURE_2D, tex)
 
-        GL.glDrawElements(GL.GL_TRIANGLE_STRIP, 4, GL.GL_UNSIGNED_BYTE, GL.GLvoidp(0))
+        GL.glDrawArrays(GL.GL_TRIANGLE_STRIP, 0, 4)
 
     def resizeGL(self, width: int, height: int):
         """Called whenever the widget has been resized.
@@ -300,79 +574,125 @@ class YCbCrDisplayWidget(qglw.QOpenGLWidget):
 
     def cleanup(self):
         """Release all acquired resources."""
+        # Uploader's context shares objects with ours, release it first
+        qtc.QMetaObject.invokeMethod(
+            self._uploader, "release", qtc.Qt.ConnectionType.BlockingQueuedConnection
+        )
+        self._upload_thread.quit()
+        self._upload_thread.wait()
+        self._upload_thread = None
+        self._uploader = None
+
         # Must make context current before using OpenGL API
         self.makeCurrent()
 
-        GL.glDeleteTextures([self._tex_y, self._tex_cb, self._tex_cr])
-        self._tex_y, self._tex_cb, self._tex_cr = [None] * 3
-
-        GL.glDeleteBuffers([self._buff_vertices, self._buff_indices])
-        self._buff_vertices = None
-        self._buff_indices = None
+        GL.glDeleteTextures(self._textures + self._back_textures)
+        self._textures = None
+        self._back_textures = None
 
         GL.glDeleteVertexArrays(self._vao)
         self._vao = None
 
         GL.glDeleteProgram(self._program)
         self._program = None
+        self._uniforms = None
 
         self.doneCurrent()
 
+    @qtc.Slot(object)
     def on_prepare(self, ycbcr: Tuple):
-        """Allocate space for textures and and initialize with frame data.
+        """Upload frame data to textures, allocating storage if needed.
 
-        This method will emit 'prepared' signal when done.
+        Frame is uploaded to the textures not being drawn, from uploader's
+        thread. This method will emit 'prepared' signal when upload is done.
 
         Args:
-            ycbcr (Tuple): A tuple of frame planes
+            ycbcr (Tuple): A tuple of frame planes, either Y, Cb and Cr as 2D
+                arrays or Y as a 2D array and interleaved CbCr as a 3D array.
+                Rows of each plane must be contiguous but may be strided.
         """
-        self.makeCurrent()
+        self._upload.emit(ycbcr, self._back_textures)
+
+    @qtc.Slot()
+    def on_render(self):
+        """Render the frame.
 
-        for i, plane, tex in zip(
-            range(3), ycbcr, [self._tex_y, self._tex_cb, self._tex_cr]
+        This method will emit 'rendered' signal once the frame is swapped to
+        screen, so that frames are not rendered faster than display shows
+        them.
+        """
+        # Last uploaded frame is drawn from now on and next one is uploaded
+        # to the textures of the frame drawn until now
+        self._textures, self._back_textures = self._back_textures, self._textures
+        self.update()
+        window = self.window().windowHandle()
+        if (
+            window is not None
+            and window.isExposed()
+            and self.isVisible()
+            and not self.size().isEmpty()
         ):
-            GL.glActiveTexture(GL.GL_TEXTURE0 + i)
-            GL.glBindTexture(GL.GL_TEXTURE_2D, tex)
+            self._swap_pending = True
+        else:
+            # Nothing is painted while widget or its window is hidden or
+            # minimized, or widget is squeezed to no size; don't wait for it
+            self.rendered.emit()
 
-            h, w = plane.shape
-            h_prev, w_prev = self._shapes[i]
-
-            if h != h_prev or w != w_prev:
-                # Allocate new storage for texture
-                GL.glTexImage2D(
-                    GL.GL_TEXTURE_2D,
-                    0,
-                    GL.GL_RED,
-                    w,
-                    h,
-                    0,
-                    GL.GL_RED,
-                    GL.GL_UNSIGNED_BYTE,
-                    None,
-                )
-            else:
-                # Reuse previous storage for texture
-                GL.glTexSubImage2D(
-                    GL.GL_TEXTURE_2D,
-                    0,
-                    0,
-                    0,
-                    w,
-                    h,
-                    GL.GL_RED,
-                    GL.GL_UNSIGNED_BYTE,
-                    plane.reshape(-1),
-                )
-            # Note current shape in-place
-            self._shapes[i][:] = h, w
+    @qtc.Slot()
+    def _on_frame_swapped(self):
+        """Emit 'rendered' signal if rendered frame was just swapped."""
+        # Widget is also repainted on its own, e.g. when resized
+        self._end_pending_swap()
 
-        self.doneCurrent()
-        self.prepared.emit()
+    def _end_pending_swap(self):
+        """Emit 'rendered' signal if rendered frame is yet to be swapped."""
+        if self._swap_pending:
+            self._swap_pending = False
+            self.rendered.emit()
 
-    def on_render(self):
-        """Render the frame.
+    def showEvent(self, ev: qtg.QShowEvent):
+        """Handle show events.
+
+        Starts watching the window widget is shown in for expose events.
 
-        This method will emit 'rendered' signal when done.
+        Args:
+            ev: Show event.
         """
-        self.update()
-        self.rendered.emit()
+        super().showEvent(ev)
+        # Window only exists once shown, and changes if widget is reparented
+        window = self.window().windowHandle()
+        if window is not self._exposed_window:
+            if self._exposed_window is not None:
+                self._exposed_window.removeEventFilter(self)
+            self._exposed_window = window
+            if window is not None:
+                window.installEventFilter(self)
+
+    def hideEvent(self, ev: qtg.QHideEvent):
+        """Handle hide events.
+
+        Args:
+            ev: Hide event.
+        """
+        super().hideEvent(ev)
+        # Hidden or minimized before rendered frame was swapped, it won't be
+        self._end_pending_swap()
+
+    def eventFilter(self, obj: qtc.QObject, ev: qtc.QEvent) -> bool:
+        """Watch for the window no longer being exposed.
+
+        Args:
+            obj: Object the event is for.
+            ev: Event.
+
+        Returns:
+            bool: False, so that the event is handled as usual.
+        """
+        if (
+            obj is self._exposed_window
+            and ev.type() == qtc.QEvent.Type.Expose
+            and not self._exposed_window.isExposed()
+        ):
+            # Covered before rendered frame was swapped, it won't be
+            self._end_pending_swap()
+        return super().eventFilter(obj, ev)
@@ -4,7 +4,7 @@ from PySide6 import QtGui as qtg
 from PySide6 import QtWidgets as qtw
 
 from numbat.aboutdialog import AboutDialog
-from numbat.decoder import Decoder
+from numbat.decoder import DecodedFrame, Decoder
 from numbat.mainwindow_ui import Ui_MainWindow
 from numbat.videotimer import VideoTimer
 
@@ -12,6 +12,10 @@ from numbat.videotimer import VideoTimer
 class MainWindow(qtw.QMainWindow):
     """Main window of application."""
 
+    # Sent from a pooled thread when a video has been opened, or not
+    _loaded = qtc.Signal(object)
+    _load_failed = qtc.Signal(str)
+
     video_files_filter = "Videos (*.mkv *.avi *.mp4 *.mov)"
     all_files_filter = "All files (*)"
 
@@ -24,12 +28,19 @@ class MainWindow(qtw.QMainWindow):
         self.ui.btn_play.setEnabled(False)
         self.ui.seek_bar.setEnabled(False)
         self._decoder = None
+        # Decoding happens away from GUI thread to keep timer responsive
+        self._decode_thread = None
         self._timer = None
+        # Set once window is closed, so that a video still being opened is
+        # closed right away instead of being played
+        self._closing = False
 
         self.ui.act_file_open.triggered.connect(self.on_file_open)
         self.ui.act_about.triggered.connect(self._on_about_dialog)
         self.ui.seek_bar.seeked.connect(self._on_seeked)
         self.ui.btn_play.clicked.connect(self._on_play)
+        self._loaded.connect(self._on_loaded)
+        self._load_failed.connect(self._on_load_failed)
 
         self._play_icon = qtg.QIcon(":/images/play.svg")
         self._pause_icon = qtg.QIcon(":/images/pause.svg")
@@ -52,33 +63,93 @@ class MainWindow(qtw.QMainWindow):
 
         # Open file for FFMpeg
         if len(file_path) > 0:
-            self._decoder = Decoder(file_path)
-            # Enable play/pause button and seekbar
-            self.ui.btn_play.setEnabled(True)
-            self.ui.seek_bar.setEnabled(True)
-            self.ui.seek_bar.setRange(0, self._decoder.duration)
-            self._decoder.decoded.connect(self._on_decoded)
-            self._decoder.finished.connect(self._on_finished)
-            self._timer = VideoTimer()
-            self._timer.bind_decoder(self._decoder)
-            self._timer.bind_renderer(self.ui.glwgt_video)
-
-        if self._timer is not None:
+            self._on_finished()
+            self._timer = None
+            # Opening may take a while e.g. on slow storage, so it is done away
+            # from GUI thread; no other file can be opened in the meantime
+            self.ui.act_file_open.setEnabled(False)
+            qtc.QThreadPool.globalInstance().start(
+                lambda: self._load_decoder(file_path)
+            )
+        elif self._timer is not None:
             self.ui.btn_play.setIcon(self._pause_icon)
             self._timer.start()
 
-    def _on_decoded(self, pts_sec: float):
+    def _load_decoder(self, file_path: str):
+        """Open a decoder for the video at given path.
+
+        Runs in a pooled thread. Emits '_loaded' signal with the decoder, or
+        '_load_failed' signal with the reason if video can't be opened.
+
+        Args:
+            file_path: Path to video file.
+        """
+        try:
+            decoder = Decoder(file_path)
+        except Exception as e:
+            # Any error escaping pooled thread would leave open action disabled
+            self._load_failed.emit(str(e))
+            return
+        if self._closing:
+            # Window was closed while video was being opened
+            decoder.close()
+            return
+        # Only the thread an object lives in can move it to another thread
+        decoder.moveToThread(self.thread())
+        self._loaded.emit(decoder)
+
+    @qtc.Slot(object)
+    def _on_loaded(self, decoder: Decoder):
+        """Start playing the video once it is opened.
+
+        Args:
+            decoder: Decoder of opened video.
+        """
+        self.ui.act_file_open.setEnabled(True)
+        if self._closing:
+            # Emitted just before window was closed, so it arrives afterwards
+            decoder.close()
+            return
+        self._decoder = decoder
+        self._decode_thread = qtc.QThread()
+        self._decoder.moveToThread(self._decode_thread)
+        self._decode_thread.start()
+        # Enable play/pause button and seekbar
+        self.ui.btn_play.setEnabled(True)
+        self.ui.seek_bar.setEnabled(True)
+        self.ui.seek_bar.setRange(0, self._decoder.duration)
+        self.ui.glwgt_video.set_full_range(self._decoder.full_range)
+        self._decoder.decoded.connect(self._on_decoded)
+        self._decoder.finished.connect(self._on_finished)
+        self._timer = VideoTimer()
+        self._timer.bind_decoder(self._decoder)
+        self._timer.bind_renderer(self.ui.glwgt_video)
+        self.ui.btn_play.setIcon(self._pause_icon)
+        self._timer.start()
+
+    @qtc.Slot(str)
+    def _on_load_failed(self, reason: str):
+        """Tell that the video could not be opened.
+
+        Args:
+            reason: Why video could not be opened.
+        """
+        self.ui.act_file_open.setEnabled(True)
+        qtw.QMessageBox.critical(self, "Could not open video", reason)
+
+    @qtc.Slot(object)
+    def _on_decoded(self, frame: DecodedFrame):
         """Update seek bar to decoded frame's timestamp.
 
         Args:
-            pts_sec: Stream timestamp in seconds.
+            frame: Decoded frame.
         """
         # If slider is being held down, seek bar should not be updated
         if not self.ui.seek_bar.isSliderDown():
-            # Convert pts_sec to stream's time_base
-            seek_to = int(pts_sec / self._decoder.time_base)
-            self.ui.seek_bar.setValue(seek_to)
+            # Seek bar's range is in stream's time_base like frame's pts
+            self.ui.seek_bar.setValue(frame.pts)
 
+    @qtc.Slot(int)
     def _on_seeked(self, val: int):
         """Handle seek signal emitted by seek bar.
 
@@ -89,13 +160,15 @@ class MainWindow(qtw.QMainWindow):
         if self._timer.is_paused():
             self._timer.decode.emit()
 
+    @qtc.Slot()
     def _on_finished(self):
         """Handle end of video playback."""
-        self._decoder = None
+        self._close_decoder()
         self.ui.seek_bar.setValue(0)
         self.ui.seek_bar.setDisabled(True)
         self.ui.btn_play.setDisabled(True)
 
+    @qtc.Slot()
     def _on_play(self):
         """Handle play/pause button click.
 
@@ -109,6 +182,29 @@ class MainWindow(qtw.QMainWindow):
                 self.ui.btn_play.setIcon(self._play_icon)
                 self._timer.pause()
 
+    def _close_decoder(self):
+        """Stop the decoding thread and release the decoder, if any."""
+        if self._decode_thread is not None:
+            self._decode_thread.quit()
+            self._decode_thread.wait()
+            self._decode_thread = None
+        self._decoder = None
+
+    def closeEvent(self, ev: qtg.QCloseEvent):
+        """Handle window close events.
+
+        Args:
+            ev: Close event.
+        """
+        self._closing = True
+        if self._timer is not None:
+            self._timer.stop()
+        self._close_decoder()
+        # Let a video being opened finish, it is closed once loaded
+        qtc.QThreadPool.globalInstance().waitForDone()
+        super().closeEvent(ev)
+
+    @qtc.Slot()
     def _on_about_dialog(self):
         """Show 'About' dialog."""
         dlg_about = AboutDialog(self)
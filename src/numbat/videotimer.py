@@ -1,8 +1,13 @@
 """Utility classes to coordinate frame timings."""
-from typing import Any, Tuple
+import logging
+from typing import Any
 
 from PySide6 import QtCore as qtc
 
+# Per frame debug messages are only emitted once debug level is enabled for
+# 'numbat.videotimer' logger, e.g. with logging.basicConfig(level=DEBUG)
+_log = logging.getLogger(__name__)
+
 
 class AlignableTimer:
     """A timer whose starting time can be aligned to any time value."""
@@ -12,20 +17,20 @@ class AlignableTimer:
         self._base = None
         self._clock = qtc.QElapsedTimer()
 
-    def start(self, ms=0):
+    def start(self, ns=0):
         """Start the clock set to given initial time.
 
         If the timer is already started, it is restarted.
 
         Args:
-            ms: Time in milliseconds that timer is set to before starting.
+            ns: Time in nanoseconds that timer is set to before starting.
         """
-        self._base = ms
+        self._base = ns
         self._clock.start()
 
     def elapsed(self) -> int:
-        """Time elapsed in milliseconds since the timer was last started."""
-        return self._base + self._clock.elapsed()
+        """Time elapsed in nanoseconds since the timer was last started."""
+        return self._base + self._clock.nsecsElapsed()
 
 
 class VideoTimer(qtc.QObject):
@@ -43,9 +48,19 @@ class VideoTimer(qtc.QObject):
     """
 
     decode = qtc.Signal()
-    prepare = qtc.Signal(tuple)
+    prepare = qtc.Signal(object)
     render = qtc.Signal()
 
+    # QTimer only has millisecond resolution and may fire a bit late, so it
+    # is set to fire this early and at most this much of the remaining wait
+    # is slept precisely
+    _early_ns = 1_500_000
+    # How late QTimer fires is averaged over roughly this many timeouts
+    _bias_timeouts = 10
+    # Most frames dropped in a row for running late, so that video is still
+    # updated every so often when it can't keep up
+    _max_dropped_in_row = 4
+
     def __init__(self):
         """Create a video timer."""
         super().__init__()
@@ -55,56 +70,91 @@ class VideoTimer(qtc.QObject):
         self._timer = qtc.QTimer()
         self._timer.setSingleShot(True)
         self._timer.setTimerType(qtc.Qt.TimerType.PreciseTimer)
-        self._timer.timeout.connect(self._on_timeout)
-        # Previous presentation time in ms
+        self._timer.timeout.connect(self._on_timer_expired)
+        # When the timer is due to expire and moving average of how late it
+        # expires on this platform, both in ns
+        self._timer_due = 0
+        self._timer_bias = 0
+        # Previous presentation time in ns
         # Initially -1 so that first timestamp >= this timestamp
         self._last_presented_at = -1
-        # Presentation time in ms
+        # Presentation time in ns
         self._present_at = 0
+        # Time in ns between current and previous frame, 0 if unknown
+        self._frame_period = 0
+        # Frames dropped in total and in a row for being too late
+        self._dropped = 0
+        self._dropped_in_row = 0
         # Pause/Resume functionality
         self._running = False
 
-    @qtc.Slot(float, tuple)
-    def on_decoded(self, pt_sec: float, frame: Tuple, seeked: bool):
+    @qtc.Slot(object)
+    def on_decoded(self, frame: Any):
         """Get notified when a frame is decoded.
 
+        Emits 'prepare' signal with frame's planes unless frame is skipped.
+
         Args:
-            pt_sec: Presentation time in seconds.
-            frame: Frame components received from decoder.
-            seeked: Whether decoded frame is a result of seek operation.
+            frame: Frame received from decoder. It must provide 'time_ns'
+                (presentation time in whole nanoseconds), 'planes' (frame
+                components for renderer) and 'seeked' (whether frame is a
+                result of seek operation) attributes.
         """
-        present_at_ms = int(pt_sec * 1000)
+        present_at = frame.time_ns
+        period = present_at - self._present_at
         # First frame
         if self._last_presented_at < 0:
             # Start the clock only after decoding the first frame
             self._clock.start()
-        elif seeked:
+            period = 0
+        elif frame.seeked:
             # Pretend that we have 30 ms to render next frame
-            self._clock.start(present_at_ms - 30)
+            self._clock.start(present_at - 30_000_000)
             self._last_presented_at = -1
+            period = 0
 
-        if present_at_ms <= self._last_presented_at:
+        if present_at <= self._last_presented_at:
             # Skip frame since last frame was drawn too late
-            qtc.qDebug("Skipping frame with pts {}".format(present_at_ms))
+            if _log.isEnabledFor(logging.DEBUG):
+                _log.debug("Skipping frame with pts %d ns", present_at)
             self.decode.emit()
             return
         # Update current presentation time for later timer call
-        self._present_at = present_at_ms
-        self.prepare.emit(frame)
+        self._present_at = present_at
+        self._frame_period = period
+        self.prepare.emit(frame.planes)
 
     @qtc.Slot()
+    def _on_timer_expired(self):
+        """Track how late the timer expired and handle its expiration."""
+        # Clamped so that an occasional stall, e.g. a busy event loop, does
+        # not throw off the average for long
+        late = self._clock.elapsed() - self._timer_due
+        late = max(-self._early_ns, min(late, self._early_ns))
+        self._timer_bias += (late - self._timer_bias) // self._bias_timeouts
+        self._on_timeout()
+
     def _on_timeout(self):
-        """Handle timer expiration.
+        """Present the frame at its presentation time.
 
-        Timer is started after resources are allocated for rendering and only
-        if some positive time is left for render call.
+        Called on timer expiration. Timer is started after resources are
+        allocated for rendering and only if some time is left for render
+        call, otherwise this is called directly.
         """
+        rem = self._present_at - self._clock.elapsed()
+        if rem > 0:
+            # Timer fires early on purpose, wait out the remainder. Sleep
+            # blocks GUI thread, so it is capped at the early margin; any
+            # more left, e.g. from rounding timer down to ms, is not waited.
+            # Sleeping releases GIL so that decoding carries on meanwhile.
+            qtc.QThread.usleep(min(rem, self._early_ns) // 1000)
         self._last_presented_at = self._clock.elapsed()
-        qtc.qDebug(
-            "Presented frame with pts {} at {} ms".format(
-                self._present_at, self._last_presented_at
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug(
+                "Presented frame with pts %d ns at %d ns",
+                self._present_at,
+                self._last_presented_at,
             )
-        )
         self.render.emit()
 
     @qtc.Slot()
@@ -119,13 +169,40 @@ class VideoTimer(qtc.QObject):
 
     @qtc.Slot()
     def on_prepared(self):
-        """Get notified when resource allocation for rendering is complete."""
-        rem = self._present_at - self._clock.elapsed()
-        if rem <= 0:
-            # No time left, just trigger timeout handler directly
+        """Get notified when resource allocation for rendering is complete.
+
+        Frame is dropped instead of rendered if it is late by more than the
+        time between it and previous frame, so that lateness does not carry
+        over to the frames after.
+        """
+        now = self._clock.elapsed()
+        if (
+            0 < self._frame_period < now - self._present_at
+            and self._dropped_in_row < self._max_dropped_in_row
+        ):
+            self._dropped += 1
+            self._dropped_in_row += 1
+            if _log.isEnabledFor(logging.DEBUG):
+                _log.debug("Dropping frame with pts %d ns", self._present_at)
+            # Move on to next frame as if this one was rendered
+            self.on_rendered()
+            return
+        self._dropped_in_row = 0
+        # Start timer earlier by as much as it tends to expire late
+        wait_ms = (
+            self._present_at - now - self._early_ns - self._timer_bias
+        ) // 1_000_000
+        if wait_ms <= 0:
+            # Little or no time left, just trigger timeout handler directly
             self._on_timeout()
         else:
-            self._timer.start(rem)
+            self._timer_due = now + wait_ms * 1_000_000
+            self._timer.start(wait_ms)
+
+    @property
+    def dropped_frames(self) -> int:
+        """Number of frames dropped so far for being too late."""
+        return self._dropped
 
     def stop(self):
         """Stop the timer."""
@@ -159,7 +236,7 @@ class VideoTimer(qtc.QObject):
             self._running = True
             self._clock = AlignableTimer()
             prev_ts = max(0, self._last_presented_at)
-            self._clock.start(ms=prev_ts)
+            self._clock.start(ns=prev_ts)
             self.decode.emit()
 
     def bind_decoder(self, decoder: Any):
@@ -181,6 +258,12 @@ class VideoTimer(qtc.QObject):
         Additionally, a renderer object must implement 'on_prepare' and
         'on_render' slots to handle 'prepare' and 'render' signal of timer.
 
+        A renderer living in the timer's thread may emit 'prepared' from
+        within 'on_prepare' itself: Qt then calls the timer's slot directly
+        and the timer is armed before 'prepare' returns, without an event
+        loop round trip. Renderers that prepare asynchronously may emit it
+        later instead.
+
         Args:
             renderer: An object that behaves like a renderer
         """
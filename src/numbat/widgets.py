@@ -1,4 +1,6 @@
 """Custom Qt widgets."""
+import math
+
 from PySide6 import QtCore as qtc
 from PySide6 import QtGui as qtg
 from PySide6 import QtWidgets as qtw
@@ -17,6 +19,10 @@ class SeekBar(qtw.QSlider):
 
     seeked = qtc.Signal(int)
 
+    # Least time in ms between slider updates while dragging, i.e. about as
+    # often as a 60 Hz display refreshes
+    _drag_interval_ms = 16
+
     def __init__(self, parent: qtw.QWidget = None):
         """Create a new seek bar.
 
@@ -24,44 +30,122 @@ class SeekBar(qtw.QSlider):
             parent (optional): Parent widget. Defaults to None.
         """
         super().__init__(parent)
+        # While slider is held down only its position follows the mouse;
+        # value is set, and 'valueChanged' emitted, once it is released
+        self.setTracking(False)
+        # Mice may report moves far more often than display refreshes, so
+        # while dragging, slider is updated at most once per interval
+        self._drag_timer = qtc.QBasicTimer()
+        # Position last dragged to that slider is yet to be updated to
+        self._drag_pos = None
+        # Range and width kept up to date for mapping positions to values
+        self._min = self.minimum()
+        self._max = self.maximum()
+        # At least 1 since positions are divided by it
+        self._width = max(self.width(), 1)
+        self.rangeChanged.connect(self._on_range_changed)
 
     def mousePressEvent(self, ev: qtg.QMouseEvent):
         """Handle mouse press events.
 
-        Only left clicks are handled by setting slider value to clicked at
-        position.
+        Only left clicks are handled by moving slider to clicked at position.
 
         Args:
             ev: Mouse event.
         """
+        if ev.button() != qtc.Qt.LeftButton:
+            super().mousePressEvent(ev)
+            return
         self.setSliderDown(True)
-        if ev.button() == qtc.Qt.LeftButton:
-            self.setValue(self._val_for_position(ev.x()))
+        self.setSliderPosition(self._val_for_position(ev.position().x()))
 
     def mouseMoveEvent(self, ev: qtg.QMouseEvent):
         """Handle mouse dragging events.
 
-        Slider value is set to position just moved to.
+        Slider is moved to position just moved to, or if it was moved just
+        recently, to the last position moved to once the interval is over.
 
         Args:
             ev: Mouse event.
         """
         # No need to check which button; it is always Qt.NoButton
-        self.setValue(self._val_for_position(ev.x()))
+        if not self.isSliderDown():
+            super().mouseMoveEvent(ev)
+        elif self._drag_timer.isActive():
+            self._drag_pos = ev.position().x()
+        else:
+            self.setSliderPosition(self._val_for_position(ev.position().x()))
+            self._drag_timer.start(self._drag_interval_ms, self)
 
     def mouseReleaseEvent(self, ev: qtg.QMouseEvent):
         """Handle mouse release events.
 
-        It emits 'seek' signal on every call.
+        Slider's value is set to its position and 'seeked' signal is emitted
+        when left button is released.
 
         Args:
             ev: Mouse event.
         """
+        if ev.button() != qtc.Qt.LeftButton:
+            super().mouseReleaseEvent(ev)
+            return
+        self._drag_timer.stop()
+        self._flush_drag()
         self.setSliderDown(False)
         self.seeked.emit(self.value())
 
-    def _val_for_position(self, pos):
+    def timerEvent(self, ev: qtc.QTimerEvent):
+        """Handle timer events.
+
+        Moves slider to position dragged to since last update, if any.
+
+        Args:
+            ev: Timer event.
+        """
+        if ev.timerId() != self._drag_timer.timerId():
+            # QAbstractSlider has timers of its own
+            super().timerEvent(ev)
+        elif not self._flush_drag():
+            # Timer keeps firing only as long as mouse keeps moving
+            self._drag_timer.stop()
+
+    def _flush_drag(self) -> bool:
+        """Move slider to position last dragged to, if not done already.
+
+        Returns:
+            bool: True if slider was moved, False otherwise.
+        """
+        if self._drag_pos is None:
+            return False
+        self.setSliderPosition(self._val_for_position(self._drag_pos))
+        self._drag_pos = None
+        return True
+
+    def resizeEvent(self, ev: qtg.QResizeEvent):
+        """Handle resize events.
+
+        Args:
+            ev: Resize event.
+        """
+        self._width = max(ev.size().width(), 1)
+        super().resizeEvent(ev)
+
+    @qtc.Slot(int, int)
+    def _on_range_changed(self, min_val: int, max_val: int):
+        """Keep track of slider's range.
+
+        Args:
+            min_val: New minimum value.
+            max_val: New maximum value.
+        """
+        self._min = min_val
+        self._max = max_val
+
+    def _val_for_position(self, pos: float):
         """Calculates slider value corresponding to the click's position."""
-        return qtw.QStyle.sliderValueFromPosition(
-            self.minimum(), self.maximum(), pos, self.width()
-        )
+        # Same as QStyle.sliderValueFromPosition() for the pixel at given
+        # position, i.e. rounded to nearest value, but without calling into Qt.
+        # Halves are rounded up like qRound(), not to even like round().
+        span = self._width
+        pos = min(max(math.floor(pos + 0.5), 0), span)
+        return self._min + (2 * pos * (self._max - self._min) + span) // (2 * span)
@@ -0,0 +1,163 @@
+import av
+import numpy as np
+import pytest
+
+from numbat.decoder import Decoder, ycbcr_to_rgb
+
+
+def make_planes(h, w, seed=0):
+    rng = np.random.default_rng(seed)
+    ch, cw = (h + 1) // 2, (w + 1) // 2
+    y = rng.integers(0, 256, (h, w), dtype=np.uint8)
+    cb = rng.integers(0, 256, (ch, cw), dtype=np.uint8)
+    cr = rng.integers(0, 256, (ch, cw), dtype=np.uint8)
+    return y, cb, cr
+
+
+def reference_rgb(y, cb, cr, full_range=True):
+    h, w = y.shape
+    y = y.astype(np.float64)
+    cb = np.repeat(np.repeat(cb, 2, 0), 2, 1)[:h, :w] - 128.0
+    cr = np.repeat(np.repeat(cr, 2, 0), 2, 1)[:h, :w] - 128.0
+    if not full_range:
+        y = (y - 16.0) * 255 / 219
+        cb *= 255 / 224
+        cr *= 255 / 224
+    r = y + 1.5748 * cr
+    g = y - 0.18732 * cb - 0.46812 * cr
+    b = y + 1.8556 * cb
+    return np.clip(np.rint(np.dstack((r, g, b))), 0, 255)
+
+
+@pytest.mark.parametrize("h, w", [(4, 6), (50, 90), (7, 9), (131, 90)])
+def test_ycbcr_to_rgb_planar(h, w):
+    y, cb, cr = make_planes(h, w)
+    rgb = ycbcr_to_rgb((y, cb, cr))
+
+    assert rgb.shape == (h, w, 3)
+    assert rgb.dtype == np.uint8
+    assert np.abs(rgb - reference_rgb(y, cb, cr)).max() <= 1
+
+
+@pytest.mark.parametrize("h, w", [(50, 90), (131, 90)])
+def test_ycbcr_to_rgb_planar_limited_range(h, w):
+    y, cb, cr = make_planes(h, w)
+    rgb = ycbcr_to_rgb((y, cb, cr), full_range=False)
+
+    assert rgb.dtype == np.uint8
+    assert np.abs(rgb - reference_rgb(y, cb, cr, full_range=False)).max() <= 1
+
+
+def test_ycbcr_to_rgb_nv12_matches_planar():
+    y, cb, cr = make_planes(50, 90)
+    cbcr = np.dstack((cb, cr))
+
+    assert np.array_equal(ycbcr_to_rgb((y, cbcr)), ycbcr_to_rgb((y, cb, cr)))
+
+
+def test_ycbcr_to_rgb_gray():
+    y = np.full((4, 4), 77, np.uint8)
+    c = np.full((2, 2), 128, np.uint8)
+
+    assert np.all(ycbcr_to_rgb((y, c, c)) == 77)
+
+
+def test_ycbcr_to_rgb_strided_planes():
+    y, cb, cr = make_planes(50, 90)
+    # Padded planes as produced by Decoder
+    padded = [np.zeros((p.shape[0], p.shape[1] + 38), np.uint8) for p in (y, cb, cr)]
+    for dst, src in zip(padded, (y, cb, cr)):
+        dst[:, : src.shape[1]] = src
+    views = tuple(p[:, : s.shape[1]] for p, s in zip(padded, (y, cb, cr)))
+
+    assert np.array_equal(ycbcr_to_rgb(views), ycbcr_to_rgb((y, cb, cr)))
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    # Width not a multiple of 32 so that decoded planes are padded
+    path = str(tmp_path / "video.mp4")
+    with av.open(path, mode="w") as container:
+        stream = container.add_stream("mpeg4", rate=30)
+        stream.width, stream.height = 90, 50
+        stream.pix_fmt = "yuv420p"
+        rng = np.random.default_rng(0)
+        for _ in range(5):
+            rgb = rng.integers(0, 256, (50, 90, 3), dtype=np.uint8)
+            frame = av.VideoFrame.from_ndarray(rgb, format="rgb24")
+            container.mux(stream.encode(frame))
+        container.mux(stream.encode())
+    return path
+
+
+def decode_all(decoder):
+    frames = []
+    decoder.decoded.connect(frames.append)
+    while not decoder.is_closed():
+        decoder.on_decode()
+    return frames
+
+
+def test_decoder_planes(qtbot, video_path):
+    with av.open(video_path) as container:
+        decoded = list(container.decode(video=0))
+        expected = [f.to_ndarray() for f in decoded]
+        times = [int(f.pts * f.time_base * 1_000_000_000) for f in decoded]
+
+    frames = decode_all(Decoder(video_path, hwaccel=False))
+
+    assert len(frames) == len(expected)
+    assert [frame.time_ns for frame in frames] == times
+    for frame, packed in zip(frames, expected):
+        y, cb, cr = frame.planes
+        assert y.shape == (50, 90) and cb.shape == cr.shape == (25, 45)
+        # to_ndarray() packs Y, Cb and Cr planes one after the other
+        assert np.array_equal(y, packed[:50])
+        chroma = packed[50:].reshape(2, 25, 45)
+        assert np.array_equal(cb, chroma[0])
+        assert np.array_equal(cr, chroma[1])
+
+
+def test_decoder_unsupported_format(tmp_path):
+    path = str(tmp_path / "video.mkv")
+    with av.open(path, mode="w") as container:
+        stream = container.add_stream("ffv1", rate=30)
+        stream.width, stream.height = 16, 16
+        stream.pix_fmt = "yuv444p"
+        frame = av.VideoFrame.from_ndarray(np.zeros((16, 16, 3), np.uint8), "rgb24")
+        container.mux(stream.encode(frame))
+        container.mux(stream.encode())
+
+    with pytest.raises(ValueError, match="yuv444p"):
+        Decoder(path, hwaccel=False)
+
+
+def test_decoder_no_video_stream(tmp_path):
+    path = str(tmp_path / "audio.mka")
+    with av.open(path, mode="w") as container:
+        stream = container.add_stream("pcm_s16le", rate=8000)
+        frame = av.AudioFrame.from_ndarray(
+            np.zeros((1, 800), np.int16), format="s16", layout="mono"
+        )
+        frame.sample_rate = 8000
+        container.mux(stream.encode(frame))
+        container.mux(stream.encode())
+
+    with pytest.raises(ValueError, match="no video stream"):
+        Decoder(path, hwaccel=False)
+
+
+def test_decoder_full_range(tmp_path, video_path):
+    # Matroska stores color range in container, MP4 does not for MPEG-4
+    path = str(tmp_path / "full.mkv")
+    with av.open(path, mode="w") as container:
+        stream = container.add_stream("mpeg4", rate=30)
+        stream.width, stream.height = 16, 16
+        stream.pix_fmt = "yuv420p"
+        stream.codec_context.color_range = 2
+        frame = av.VideoFrame.from_ndarray(np.zeros((16, 16, 3), np.uint8), "rgb24")
+        container.mux(stream.encode(frame))
+        container.mux(stream.encode())
+
+    assert Decoder(path, hwaccel=False).full_range
+    assert not Decoder(video_path, hwaccel=False).full_range
@@ -1,25 +1,31 @@
-import time
+import logging
 
 from PySide6 import QtCore as qtc
 
+from numbat import videotimer
+from numbat.decoder import DecodedFrame
 from numbat.videotimer import VideoTimer
 
 
 class DummyDecoder(qtc.QObject):
-    decoded = qtc.Signal(float, tuple, bool)
+    decoded = qtc.Signal(object)
     finished = qtc.Signal()
 
     def __init__(self, seq_pts, decode_time=0.1):
         super().__init__()
-        self._seq_pts = iter(seq_pts)
-        self._decode_time = decode_time
+        self._seq_pts = list(seq_pts)
+        # Index of next pts to decode
+        self._index = 0
+        self._decode_ms = int(decode_time * 1000)
 
     @qtc.Slot()
     def on_decode(self):
-        pts_sec = next(self._seq_pts, None)
-        if pts_sec is not None:
-            time.sleep(self._decode_time)
-            self.decoded.emit(pts_sec, None, False)
+        if self._index < len(self._seq_pts):
+            pts_ns = self._seq_pts[self._index]
+            self._index += 1
+            # Takes a while without blocking event loop of decoder's thread
+            frame = DecodedFrame(None, pts_ns, None)
+            qtc.QTimer.singleShot(self._decode_ms, lambda: self.decoded.emit(frame))
         else:
             self.finished.emit()
 
@@ -30,29 +36,24 @@ class DummyRenderer(qtc.QObject):
 
     def __init__(self, prep_time=0.1, render_time=0.1):
         super().__init__()
-        self._prep_time = prep_time
-        self._render_time = render_time
+        self._prep_ms = int(prep_time * 1000)
+        self._render_ms = int(render_time * 1000)
 
-    @qtc.Slot(tuple)
+    @qtc.Slot(object)
     def on_prepare(self, frame_components):
-        time.sleep(self._prep_time)
-        self.prepared.emit()
+        qtc.QTimer.singleShot(self._prep_ms, self.prepared.emit)
 
     @qtc.Slot()
     def on_render(self):
-        time.sleep(self._render_time)
-        self.rendered.emit()
+        qtc.QTimer.singleShot(self._render_ms, self.rendered.emit)
 
 
 def test_video_timer_signal_seq(qtbot):
     timer = VideoTimer()
 
-    decoder = DummyDecoder([1.0])
+    decoder = DummyDecoder([1_000_000_000])
     renderer = DummyRenderer()
 
-    timer.bind_decoder(decoder)
-    timer.bind_renderer(renderer)
-
     signals = [
         (timer.decode, "decode"),
         (decoder.decoded, "decoded"),
@@ -61,7 +62,87 @@ def test_video_timer_signal_seq(qtbot):
         (timer.render, "render"),
         (renderer.rendered, "rendered"),
     ]
+    # All objects live in this thread, so names are recorded as signals are
+    # emitted, before the slots bound below run
+    emitted = []
+    for signal, name in signals:
+        signal.connect(lambda *args, name=name: emitted.append(name))
+
+    timer.bind_decoder(decoder)
+    timer.bind_renderer(renderer)
+
+    with qtbot.waitSignal(renderer.rendered):
+        timer.start()
+
+    assert emitted[: len(signals)] == [name for _, name in signals]
+
+
+def test_video_timer_logs_presented_frames(qtbot, caplog):
+    assert videotimer._log.name == "numbat.videotimer"
+    caplog.set_level(logging.DEBUG, logger="numbat.videotimer")
+    timer = VideoTimer()
+    decoder = DummyDecoder([1_000_000_000], decode_time=0.01)
+    renderer = DummyRenderer(prep_time=0.01, render_time=0.01)
+    timer.bind_decoder(decoder)
+    timer.bind_renderer(renderer)
+
+    with qtbot.waitSignal(renderer.rendered):
+        timer.start()
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert len(messages) == 1
+    assert messages[0].startswith("Presented frame with pts 1000000000 ns")
+
+
+def test_video_timer_threaded_decoder(qtbot):
+    timer = VideoTimer()
+
+    decoder = DummyDecoder([0, 50_000_000], decode_time=0.01)
+    renderer = DummyRenderer(prep_time=0.01, render_time=0.01)
+
+    thread = qtc.QThread()
+    decoder.moveToThread(thread)
+    thread.start()
 
-    # checking order using 'order' arg seems buggy
-    with qtbot.waitSignals(signals):
+    timer.bind_decoder(decoder)
+    timer.bind_renderer(renderer)
+
+    try:
+        with qtbot.waitSignals([renderer.rendered, decoder.finished]):
+            timer.start()
+    finally:
+        thread.quit()
+        thread.wait()
+
+
+def test_video_timer_drops_late_frames(qtbot):
+    timer = VideoTimer()
+
+    # Preparing a frame takes longer than two frame periods
+    decoder = DummyDecoder([i * 30_000_000 for i in range(8)], decode_time=0)
+    renderer = DummyRenderer(prep_time=0.07, render_time=0)
+
+    timer.bind_decoder(decoder)
+    timer.bind_renderer(renderer)
+
+    with qtbot.waitSignal(decoder.finished):
         timer.start()
+
+    assert timer.dropped_frames > 0
+
+
+def test_video_timer_skips_duplicate_pts(qtbot):
+    timer = VideoTimer()
+
+    decoder = DummyDecoder([0, 0, 20_000_000], decode_time=0)
+    renderer = DummyRenderer(prep_time=0, render_time=0)
+    prepared = []
+    timer.prepare.connect(prepared.append)
+
+    timer.bind_decoder(decoder)
+    timer.bind_renderer(renderer)
+
+    with qtbot.waitSignal(decoder.finished):
+        timer.start()
+
+    assert len(prepared) == 2
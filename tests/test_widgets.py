@@ -0,0 +1,100 @@
+import pytest
+from PySide6 import QtCore as qtc
+from PySide6 import QtWidgets as qtw
+
+from numbat.widgets import SeekBar
+
+
+def make_seek_bar(qtbot):
+    seek_bar = SeekBar()
+    seek_bar.setOrientation(qtc.Qt.Orientation.Horizontal)
+    seek_bar.setRange(0, 1000)
+    seek_bar.resize(200, 20)
+    qtbot.addWidget(seek_bar)
+    # Like any widget, it only receives mouse events when shown
+    seek_bar.show()
+    qtbot.waitExposed(seek_bar)
+    return seek_bar
+
+
+def test_seek_bar_drag_coalesces_moves(qtbot):
+    seek_bar = make_seek_bar(qtbot)
+    # Long enough for the interval to never end during the test
+    seek_bar._drag_interval_ms = 60_000
+    positions = []
+    values = []
+    seek_bar.sliderMoved.connect(positions.append)
+    seek_bar.valueChanged.connect(values.append)
+
+    def val(x):
+        return qtw.QStyle.sliderValueFromPosition(0, 1000, x, 200)
+
+    qtbot.mousePress(seek_bar, qtc.Qt.MouseButton.LeftButton, pos=qtc.QPoint(10, 10))
+    for x in range(20, 120, 10):
+        qtbot.mouseMove(seek_bar, qtc.QPoint(x, 10))
+    # First move moves the slider right away, the rest within the interval
+    # are held back
+    assert positions == [val(10), val(20)]
+    assert seek_bar._drag_timer.isActive()
+    assert values == []
+
+    with qtbot.waitSignal(seek_bar.seeked) as blocker:
+        qtbot.mouseRelease(
+            seek_bar, qtc.Qt.MouseButton.LeftButton, pos=qtc.QPoint(110, 10)
+        )
+
+    # Release moves slider to last position moved to, and only then is value
+    # changed
+    assert positions == [val(10), val(20), val(110)]
+    assert not seek_bar._drag_timer.isActive()
+    assert values == [val(110)]
+    assert blocker.args == [val(110)]
+
+
+def test_seek_bar_click_after_range_and_size_change(qtbot):
+    seek_bar = make_seek_bar(qtbot)
+    seek_bar.setRange(100, 500)
+    seek_bar.resize(400, 20)
+
+    with qtbot.waitSignal(seek_bar.seeked) as blocker:
+        qtbot.mouseClick(
+            seek_bar, qtc.Qt.MouseButton.LeftButton, pos=qtc.QPoint(100, 10)
+        )
+
+    assert blocker.args == [qtw.QStyle.sliderValueFromPosition(100, 500, 100, 400)]
+
+
+def test_seek_bar_ignores_right_click(qtbot):
+    seek_bar = make_seek_bar(qtbot)
+    seeked = []
+    seek_bar.seeked.connect(seeked.append)
+
+    qtbot.mouseClick(seek_bar, qtc.Qt.MouseButton.RightButton, pos=qtc.QPoint(100, 10))
+
+    assert not seek_bar.isSliderDown()
+    assert seek_bar.value() == 0
+    assert seeked == []
+
+
+@pytest.mark.parametrize(
+    "min_val, max_val, width", [(0, 1000, 200), (100, 500, 400), (0, 7, 333)]
+)
+def test_seek_bar_values_match_style(qtbot, min_val, max_val, width):
+    seek_bar = make_seek_bar(qtbot)
+    seek_bar.setRange(min_val, max_val)
+    seek_bar.resize(width, 20)
+
+    for pos in range(-5, width + 5):
+        expected = qtw.QStyle.sliderValueFromPosition(min_val, max_val, pos, width)
+        assert seek_bar._val_for_position(pos) == expected
+
+
+def test_seek_bar_rounds_half_positions_up(qtbot):
+    seek_bar = make_seek_bar(qtbot)
+    seek_bar.setRange(0, 7)
+    seek_bar.resize(333, 20)
+
+    # Like qRound(), and unlike round() which rounds e.g. 2.5 down to 2
+    for pos in range(-5, 333 + 5):
+        expected = qtw.QStyle.sliderValueFromPosition(0, 7, pos + 1, 333)
+        assert seek_bar._val_for_position(pos + 0.5) == expected